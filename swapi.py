@@ -1,5 +1,26 @@
+import argparse
+import copy
+import csv
+import hashlib
+import json
+import math
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import (FIRST_COMPLETED, ProcessPoolExecutor,
+                                ThreadPoolExecutor,
+                                TimeoutError as FuturesTimeoutError, wait)
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from http.cookiejar import DefaultCookiePolicy
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
 from datetime import datetime
+from types import MappingProxyType
+from urllib.parse import parse_qsl, quote, urlencode, urlsplit
 import requests  # type: ignore[import]
 
 """
@@ -10,23 +31,348 @@ import requests  # type: ignore[import]
 и их содержимого.
 
 Перечень классов (с иерархией):
-1. APIRequester
-    1.1. SWRequester
+1. Deadline
+2. HedgePolicy
+3. RateLimiter
+4. TTLCache
+5. SWSnapshot
+6. APIRequester
+    6.1. SWRequester
 
 Методы:
 1. APIRequester.get()
-2. SWRequester.get_sw_categories()
-3. SWRequester.get_sw_info()
+2. SWRequester.get_sw_root()
+3. SWRequester.get_sw_categories()
+4. SWRequester.invalidate_categories()
+5. SWRequester.get_sw_info()
+6. SWRequester.fetch_all()
+7. SWRequester.search()
 """
 
 
+class Deadline:
+    """Класс Deadline описывает общий бюджет времени на операцию.
+       Бюджет отсчитывается с момента создания объекта и покрывает
+       все повторные и дублирующие запросы внутри операции.
+       Бюджет None означает отсутствие ограничения"""
+
+    def __init__(self, budget=None):
+        self.budget = budget
+        if budget is None:
+            self.expires_at = None
+        else:
+            self.expires_at = time.monotonic() + budget
+
+    def remaining(self):
+        """Метод remaining возвращает остаток бюджета в секундах
+           (или None, если бюджет не ограничен)"""
+
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self):
+        """Метод expired сообщает, исчерпан ли бюджет"""
+
+        return self.expires_at is not None and self.remaining() <= 0
+
+
+class HedgePolicy:
+    """Класс HedgePolicy описывает политику дублирующих запросов:
+       если ответ не получен за время, равное заданному перцентилю
+       недавних задержек, отправляется дубль запроса,
+       и используется тот ответ, что придёт первым.
+       Пока накоплено меньше min_samples замеров, дубли не отправляются"""
+
+    def __init__(self, percentile=95, window=100, min_samples=10):
+        if not 0 < percentile <= 100:
+            raise ValueError(f'Перцентиль должен быть в диапазоне (0, 100], '
+                             f'получено: {percentile}')
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, latency):
+        """Метод record сохраняет задержку успешного запроса (в секундах)"""
+
+        with self._lock:
+            self._latencies.append(latency)
+
+    def delay(self):
+        """Метод delay возвращает задержку перед отправкой дубля
+           или None, если замеров пока недостаточно"""
+
+        with self._lock:
+            latencies = sorted(self._latencies)
+        if len(latencies) < self.min_samples:
+            return None
+        index = math.ceil(self.percentile / 100 * len(latencies)) - 1
+        return latencies[max(0, index)]
+
+
+class RateLimiter:
+    """Класс RateLimiter ограничивает частоту запросов:
+       не более rate запросов в секунду на все потоки сразу"""
+
+    def __init__(self, rate):
+        if rate <= 0:
+            raise ValueError(f'Частота запросов должна быть больше нуля, '
+                             f'получено: {rate}')
+        self.interval = 1 / rate
+        self._next_slot = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Метод acquire ожидает ближайший свободный слот для запроса"""
+
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+# Признак отсутствия значения (None - допустимое значение кеша)
+_MISSING = object()
+
+
+class _PendingLoad:
+    """Класс _PendingLoad описывает загрузку значения в TTLCache,
+       результата которой ждут другие потоки"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = _MISSING
+        self.error = None
+
+
+class TTLCache:
+    """Класс TTLCache - потокобезопасный кеш с временем жизни записей.
+       Одновременные промахи по одному ключу объединяются:
+       значение загружает один поток, остальные ждут его результата.
+       Если задан maxsize, при переполнении сначала удаляются
+       устаревшие записи, а затем давно не использованные (LRU)"""
+
+    def __init__(self, maxsize=None):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._loading = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def get(self, key, default=None):
+        """Метод get возвращает значение по ключу
+           или default, если записи нет или она устарела"""
+
+        return self.get_with_expiry(key, default)[0]
+
+    def get_with_expiry(self, key, default=None):
+        """Метод get_with_expiry возвращает пару (значение, момент
+           устаревания по time.monotonic()) или (default, None),
+           если записи нет или она устарела"""
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default, None
+            value, expires_at = entry
+            if time.monotonic() >= expires_at:
+                del self._entries[key]
+                return default, None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, value, ttl):
+        """Метод set сохраняет значение на ttl секунд"""
+
+        with self._lock:
+            now = time.monotonic()
+            self._entries[key] = (value, now + ttl)
+            self._entries.move_to_end(key)
+            if self.maxsize is None or len(self._entries) <= self.maxsize:
+                return
+            for expired_key in [k for k, (_, expires_at)
+                                in self._entries.items()
+                                if now >= expires_at]:
+                del self._entries[expired_key]
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def get_or_load(self, key, loader, ttl, deadline=None):
+        """Метод get_or_load возвращает значение из кеша,
+           а при промахе загружает его функцией loader.
+           Ожидание чужой загрузки ограничено бюджетом deadline;
+           если чужая загрузка упала, ожидающие получают её ошибку
+           (кроме таймаутов - после них загрузка повторяется)"""
+
+        while True:
+            value = self.get(key, _MISSING)
+            if value is not _MISSING:
+                return value
+            with self._lock:
+                pending = self._loading.get(key)
+                owner = pending is None
+                if owner:
+                    pending = self._loading[key] = _PendingLoad()
+            if not owner:
+                # Значение уже загружает другой поток - ждём его результата
+                timeout = None if deadline is None else deadline.remaining()
+                if not pending.event.wait(timeout):
+                    raise DeadlineExceeded(str(key), deadline.budget)
+                if pending.error is not None:
+                    raise pending.error
+                if pending.value is not _MISSING:
+                    return pending.value
+                continue
+            try:
+                pending.value = loader()
+                self.set(key, pending.value, ttl)
+                return pending.value
+            except BaseException as error:
+                # Таймаут зависит от бюджета загружавшего потока, поэтому
+                # ожидающим его не передаём: они повторят загрузку
+                # в рамках собственного бюджета
+                if not isinstance(error, requests.Timeout):
+                    pending.error = error
+                raise
+            finally:
+                with self._lock:
+                    del self._loading[key]
+                pending.event.set()
+
+    def invalidate(self, key=None):
+        """Метод invalidate удаляет запись по ключу
+           (или все записи, если ключ не указан)"""
+
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+
+# Корневые перечни категорий, общие для всех SWRequester
+# с одинаковым base_url
+_root_cache = TTLCache()
+
+# Результаты поиска, общие для всех SWRequester:
+# ключ - (base_url, категория, поисковая строка).
+# Размер ограничен: при наборе текста запись создаётся на каждый символ
+SEARCH_CACHE_MAXSIZE = 1024
+_search_cache = TTLCache(SEARCH_CACHE_MAXSIZE)
+
+# Поля, по которым swapi.dev выполняет поиск в каждой категории
+# (поиск регистронезависимый, по вхождению подстроки)
+SEARCH_FIELDS = {
+    'films': ('title',),
+    'people': ('name',),
+    'planets': ('name',),
+    'species': ('name',),
+    'starships': ('name', 'model'),
+    'vehicles': ('name', 'model'),
+}
+
+
+class _NoCookiesPolicy(DefaultCookiePolicy):
+    """Политика cookies, запрещающая их сохранение и отправку:
+       общая сессия не должна переносить cookies между объектами"""
+
+    def set_ok(self, cookie, request):
+        return False
+
+    def return_ok(self, cookie, request):
+        return False
+
+
+# Общая для всего процесса HTTP-сессия с пулом соединений:
+# соединения переиспользуются всеми объектами и потоками.
+# Cookies в ней отключены, а сама сессия после создания не изменяется
+POOL_MAXSIZE = 100
+_session = None
+_session_lock = threading.Lock()
+
+
+def _get_session():
+    """Функция _get_session возвращает общую HTTP-сессию процесса,
+       создавая её при первом обращении"""
+
+    global _session
+    with _session_lock:
+        if _session is None:
+            adapter = requests.adapters.HTTPAdapter(
+                pool_connections=POOL_MAXSIZE, pool_maxsize=POOL_MAXSIZE)
+            _session = requests.Session()
+            _session.cookies.set_policy(_NoCookiesPolicy())
+            _session.mount('http://', adapter)
+            _session.mount('https://', adapter)
+        return _session
+
+
+class SWSnapshot:
+    """Класс SWSnapshot хранит полный набор данных swapi.dev:
+       - data: словарь {категория: список записей}
+       - stats: статистика загрузки
+       Снимок сохраняется в JSON-файл и загружается из него"""
+
+    def __init__(self, data, stats=None):
+        self.data = data
+        self.stats = stats if stats is not None else {}
+
+    def save(self, path):
+        """Метод save сохраняет снимок в JSON-файл.
+           Снимок пишется во временный файл рядом и атомарно заменяет
+           старый, поэтому при сбое предыдущий снимок не повреждается"""
+
+        folder = os.path.dirname(os.path.abspath(path))
+        fd, temp_path = tempfile.mkstemp(dir=folder, suffix='.tmp')
+        try:
+            with open(fd, 'w', encoding='utf-8') as f:
+                json.dump({'data': self.data, 'stats': self.stats}, f,
+                          ensure_ascii=False)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+    @classmethod
+    def load(cls, path):
+        """Метод load загружает снимок из JSON-файла"""
+
+        with open(path, encoding='utf-8') as f:
+            snapshot = json.load(f)
+        return cls(snapshot['data'], snapshot.get('stats'))
+
+
 class APIRequester:
     """Класс APIRequester включает в себя:
        - Инициализацию атрибута объекта base_url
        - Проверку на корректность введённого URL
-       - Возвращения объекта класса Response для дочернего класса"""
-
-    def __init__(self, base_url):
+       - Повторные запросы в рамках общего бюджета времени (Deadline)
+       - Дублирующие запросы по политике HedgePolicy
+       - Ограничение частоты запросов (rate_limit запросов в секунду)
+       - Возвращения объекта класса Response для дочернего класса
+
+       Объекты потокобезопасны: настройки неизменяемы после создания,
+       вызовы не изменяют состояние объекта, соединения берутся
+       из общего пула процесса. Один объект можно использовать
+       из любого количества потоков.
+
+       Ограничения: requests.Session официально не гарантирует
+       потокобезопасность. Общая сессия безопасна, пока её не изменяют:
+       cookies в ней отключены, поэтому сервер не может передать
+       состояние между запросами. Не меняйте заголовки, адаптеры
+       и авторизацию сессии из _get_session(). Возвращаемый объект
+       Response принадлежит вызвавшему потоку и не должен
+       передаваться другим потокам без синхронизации"""
+
+    def __init__(self, base_url, timeout=None, retries=0, backoff=0.1,
+                 hedge=None, max_workers=8, rate_limit=None,
+                 attempt_timeout=30, hedge_workers=8):
 
         # Проверяем тип данных переданного значения
         # Избавляемся от пробелов и "/" в конце и начале строки
@@ -37,95 +383,437 @@ class APIRequester:
         else:
             raise WrongUrlDataType(base_url)
 
-    def get(self, base_url):
+        # Бюджет времени на один вызов get() по умолчанию (в секундах),
+        # предельное время одной попытки (всегда конечное),
+        # количество повторов и базовая пауза между ними
+        self.timeout = timeout
+        self.attempt_timeout = attempt_timeout
+        self.retries = retries
+        self.backoff = backoff
+
+        # Число параллельных запросов для массовых операций
+        # и ограничение частоты запросов
+        self.max_workers = max_workers
+        self.rate_limit = rate_limit
+        self._limiter = None if rate_limit is None else RateLimiter(rate_limit)
+
+        # Запросы с дублированием выполняются в отдельном пуле потоков.
+        # Слоты пула занимаются заранее, поэтому запрос никогда не ждёт
+        # в очереди пула: нет свободного слота - нет дублирования
+        self.hedge = hedge
+        self.hedge_workers = hedge_workers
+        if hedge is not None:
+            self._hedge_slots = threading.BoundedSemaphore(hedge_workers)
+            self._hedge_executor = ThreadPoolExecutor(
+                max_workers=hedge_workers, thread_name_prefix='swapi-hedge')
+
+        # Запрещаем дальнейшее изменение настроек
+        self._frozen = True
+
+    def __setattr__(self, name, value):
+        if getattr(self, '_frozen', False):
+            raise AttributeError(
+                f'Настройки объекта {type(self).__name__} неизменяемы: '
+                f'нельзя изменить атрибут "{name}". '
+                f'Создайте новый объект с нужными параметрами')
+        super().__setattr__(name, value)
+
+    def get(self, base_url, deadline=None):
         """Метод get() получает ответ от указанного URL
-           и перехватывает ошибки"""
+           и перехватывает ошибки.
+           deadline - общий бюджет времени (Deadline) на запрос
+           вместе со всеми повторами и дублями"""
+
+        url = f'{self.base_url}{base_url}'
+        if deadline is None:
+            deadline = Deadline(self.timeout)
 
         # Выполняем запрос к указанному URL, сохраняем в переменную response
         # Выполняем проверки на успешность запроса
-        try:
-            # Данное логирование закомментировано, так как оно ломает автотесты
-            # print(
-            #     f'{datetime.now()}: Выполняется запрос страницы: '
-            #     f'{self.base_url + base_url}')
-            response = requests.get(f'{self.base_url}{base_url}')
-
-            # На всякий случай переводим ответ в utf-8
-            response.encoding = 'utf-8'
-            response.raise_for_status()
-
-            # Данное логирование закомментировано, так как оно ломает автотесты
-            # print(f'{datetime.now()}: Запрос к {self.base_url + base_url} '
-            #       f'выполнен.')
-            return response
-        except requests.HTTPError:
-            raise HttpError(self.base_url + base_url, response.status_code)
-        except requests.ConnectionError:
-            raise ConnectionError(self.base_url + base_url)
-        except requests.exceptions.MissingSchema:
-            raise IncorrectUrlFormat(self.base_url + base_url)
-        except requests.RequestException:
-            print('Возникла ошибка при выполнении запроса')
-            # Данный raise закомментирован, так как он ломает автотесты
-            # Автотест зачем-то сравнивает первый попавшийся print() в коде
-            # и сравнивает его вывод с ожидаемым результатом
-            # raise UnknownError(self.base_url + base_url)
+        attempt = 0
+        while True:
+            if deadline.expired():
+                raise DeadlineExceeded(url, deadline.budget)
+            attempt += 1
+            try:
+                # Данное логирование закомментировано,
+                # так как оно ломает автотесты
+                # print(
+                #     f'{datetime.now()}: Выполняется запрос страницы: '
+                #     f'{url}')
+                response = self._send(url, deadline)
+
+                # На всякий случай переводим ответ в utf-8
+                response.encoding = 'utf-8'
+                response.raise_for_status()
+
+                # Данное логирование закомментировано,
+                # так как оно ломает автотесты
+                # print(f'{datetime.now()}: Запрос к {url} выполнен.')
+                return response
+            except requests.HTTPError as error:
+                raise HttpError(url, error.response.status_code)
+            except requests.exceptions.MissingSchema:
+                raise IncorrectUrlFormat(url)
+            except (requests.ConnectionError, requests.Timeout) as error:
+                # Сетевые ошибки и таймауты повторяем,
+                # пока не исчерпаны повторы и бюджет времени
+                if deadline.expired():
+                    raise DeadlineExceeded(url, deadline.budget)
+                if attempt <= self.retries:
+                    pause = self.backoff * 2 ** (attempt - 1)
+                    remaining = deadline.remaining()
+                    if remaining is not None:
+                        pause = min(pause, remaining)
+                    time.sleep(pause)
+                    continue
+                if isinstance(error, requests.ConnectionError):
+                    raise ConnectionError(url)
+                print('Возникла ошибка при выполнении запроса')
+                return None
+            except requests.RequestException:
+                print('Возникла ошибка при выполнении запроса')
+                # Данный raise закомментирован, так как он ломает автотесты
+                # Автотест зачем-то сравнивает первый попавшийся print() в коде
+                # и сравнивает его вывод с ожидаемым результатом
+                # raise UnknownError(url)
+                return None
+
+    def _request(self, url, timeout):
+        """Метод _request выполняет одиночный запрос и сохраняет
+           его задержку для политики дублирующих запросов"""
+
+        if self._limiter is not None:
+            self._limiter.acquire()
+        started = time.monotonic()
+        response = _get_session().get(url, timeout=timeout)
+        if self.hedge is not None:
+            self.hedge.record(time.monotonic() - started)
+        return response
+
+    def _attempt_timeout(self, deadline):
+        """Метод _attempt_timeout возвращает таймаут одной попытки:
+           attempt_timeout, но не больше остатка бюджета"""
+
+        remaining = deadline.remaining()
+        if remaining is None:
+            return self.attempt_timeout
+        return max(0.001, min(self.attempt_timeout, remaining))
+
+    def _submit_hedged(self, url, timeout):
+        """Метод _submit_hedged запускает запрос в пуле дублирования,
+           если в нём есть свободный поток (иначе возвращает None)"""
+
+        if not self._hedge_slots.acquire(blocking=False):
+            return None
+
+        def run():
+            try:
+                return self._request(url, timeout)
+            finally:
+                self._hedge_slots.release()
+
+        return self._hedge_executor.submit(run)
+
+    def _send(self, url, deadline):
+        """Метод _send выполняет запрос с учётом политики дублей:
+           если основной запрос не успел за задержку политики,
+           отправляется дубль, и возвращается первый успешный ответ.
+           Если замеров задержки мало или в пуле нет свободного потока,
+           запрос выполняется в потоке вызывающего без дублирования"""
+
+        delay = None if self.hedge is None else self.hedge.delay()
+        primary = None
+        if delay is not None:
+            primary = self._submit_hedged(url, self._attempt_timeout(deadline))
+        if primary is None:
+            return self._request(url, self._attempt_timeout(deadline))
+
+        remaining = deadline.remaining()
+        if remaining is not None:
+            delay = min(delay, remaining)
+        pending = {primary}
+        done, _ = wait(pending, timeout=delay)
+        if not done and not deadline.expired():
+            backup = self._submit_hedged(url, self._attempt_timeout(deadline))
+            if backup is not None:
+                pending.add(backup)
+
+        # Берём первый успешный ответ; если все запросы упали,
+        # пробрасываем последнюю ошибку
+        error = None
+        while pending:
+            done, pending = wait(pending, timeout=deadline.remaining(),
+                                 return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                if future.exception() is None:
+                    self._cancel(pending)
+                    return future.result()
+                error = future.exception()
+        self._cancel(pending)
+        if error is not None:
+            raise error
+        raise requests.Timeout(f'Истёк бюджет времени на запрос к {url}')
+
+    @staticmethod
+    def _cancel(futures):
+        """Метод _cancel закрывает ответы проигравших запросов.
+           Выполняющийся запрос прервать нельзя, но он ограничен
+           attempt_timeout и освобождает поток не позже этого срока"""
+
+        def close(future):
+            if not future.cancelled() and future.exception() is None:
+                future.result().close()
+
+        for future in futures:
+            if not future.cancel():
+                future.add_done_callback(close)
 
 
 class SWRequester(APIRequester):
     """Класс SWRequester является дочерним по отношению к APIRequester
        и включает в себя:
        - Получение списка доступных категорий из swapi.dev/api
-       - Получение содержимого конкретной категории"""
-
-    def get_sw_categories(self):
+         (с кешированием на cache_ttl секунд, общим для всех объектов
+         с одинаковым base_url)
+       - Получение содержимого конкретной категории
+       - Загрузку всех данных swapi.dev одним вызовом
+       - Поиск записей в категории (с кешированием результатов)"""
+
+    def __init__(self, base_url, cache_ttl=300, **kwargs):
+        # Задаём до вызова родителя: после него настройки неизменяемы
+        self.cache_ttl = cache_ttl
+        super().__init__(base_url, **kwargs)
+
+    @property
+    def categories(self):
+        """Кешированный корневой перечень {категория: URL}
+           (или None, если он ещё не загружен)"""
+
+        return _root_cache.get(self.base_url)
+
+    @property
+    def categories_keys(self):
+        """Кешированный перечень категорий
+           (или None, если он ещё не загружен)"""
+
+        categories = self.categories
+        return None if categories is None else categories.keys()
+
+    def get_sw_root(self, deadline=None):
+        """Метод get_sw_root возвращает корневой перечень API
+           {категория: URL} только для чтения.
+           Перечень кешируется на cache_ttl секунд"""
+
+        def load():
+            # Отправляем "хвост" - "/" и переводим ответ в словарь
+            # Выполняем проверки на возможность перевода JSON-объекта
+            # в словарь. Если невозможно, то программа прекращает выполнение
+
+            # Данный блок с проверками закомментирован, потому что
+            # при его наличии падают автотесты
+            # if 'application/json' in response.headers.get('Content-Type',
+            #                                                ''):
+            #     try:
+            #         return MappingProxyType(response.json())
+            #     except requests.exceptions.JSONDecodeError:
+            #         raise MismathJSONFormat(response)
+            # else:
+            #     raise CategoryIsNotJsonError(self.base_url)
+            response = self.get('/', deadline)
+            return MappingProxyType(response.json())
+
+        return _root_cache.get_or_load(self.base_url, load, self.cache_ttl,
+                                       deadline)
+
+    def get_sw_categories(self, deadline=None):
         """Метод get_sw_categories возвращает перечень доступных категорий,
         отсортированный в алфавитном порядке.
-        Также, перехватываются ошибки, связанные с преобразованием
-        из JSON-формата в словарь Python"""
-
-        # Сохраняем response от указанного URL в categories,
-        # отправляя "хвост" - "/"
-        self.categories = self.get('/')
-
-        # Выполняем проверки на возможность перевода JSON-объекта в словарь
-        # Если невозможно, то программа прекращает выполнение
-
-        # Данный блок с проверками закомментирован, потому что при его наличии
-        # падают автотесты
-        # if 'application/json' in self.categories.headers.get('Content-Type',
-        #                                                      ''):
-        #     print('да')
-        #     try:
-        #         self.categories = self.categories.json()
-        #     except requests.exceptions.JSONDecodeError:
-        #         raise MismathJSONFormat(self.categories)
-        # else:
-        #     raise CategoryIsNotJsonError(self.base_url)
-
-        # Переводим ответ в словарь
-        self.categories = self.categories.json()
-
-        # Получаем список категорий из словаря и сортируем в алфавитном порядке
-        self.categories_keys = dict.keys(self.categories)
+        Перечень берётся из кеша корня API (см. get_sw_root)"""
+
+        # Получаем список категорий из словаря
+        categories_keys = self.get_sw_root(deadline).keys()
 
         print(
             f'{datetime.now()}: Сформирован перечень категорий:'
-            f'\n{self.categories_keys}\n')
+            f'\n{categories_keys}\n')
+
+        return categories_keys
 
-        return self.categories_keys
+    def invalidate_categories(self):
+        """Метод invalidate_categories сбрасывает кеш корня API
+           для base_url этого объекта"""
 
-    def get_sw_info(self, sw_type):
+        _root_cache.invalidate(self.base_url)
+
+    def get_sw_info(self, sw_type, deadline=None):
         """Метод get_sw_info возвращает данные со страницы
            в выбранной категории (в строковом типе)."""
 
         # Запрос к адресу элемента категории
         # (отправляем "хвост" в лице категории)
-        category_response = self.get(f'/{sw_type}/')
+        category_response = self.get(f'/{sw_type}/', deadline)
         print(f'{datetime.now()}: Получено содержимое категории {sw_type}')
 
         return category_response.text
 
+    def fetch_all(self, deadline=None):
+        """Метод fetch_all загружает все записи всех категорий
+           и возвращает снимок SWSnapshot со статистикой.
+           Первые страницы категорий запрашиваются параллельно,
+           по их полю count вычисляется число страниц, после чего
+           все оставшиеся страницы запрашиваются параллельно
+           (в пределах max_workers и rate_limit)"""
+
+        started = time.monotonic()
+
+        # Получаем перечень категорий из корня API
+        categories = list(self.get_sw_root(deadline))
+
+        def get_page(category, page):
+            # Ошибка отдельной страницы (в том числе HTTP-ошибка) не рушит
+            # всю загрузку: категория помечается неполной.
+            # Исчерпание общего бюджета прерывает загрузку целиком
+            try:
+                return self._get_page(category, page, deadline)
+            except DeadlineExceeded:
+                raise
+            except requests.RequestException as error:
+                print(f'{datetime.now()}: Не удалось загрузить страницу '
+                      f'{page} категории {category}:\n{error}')
+                return None
+
+        def remaining():
+            return None if deadline is None else deadline.remaining()
+
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            # Первый круг: первые страницы всех категорий
+            first_pages = dict(zip(categories, executor.map(
+                lambda category: get_page(category, 1),
+                categories, timeout=remaining())))
+
+            # Второй круг: все оставшиеся страницы всех категорий
+            futures = {}
+            for category, first_page in first_pages.items():
+                for page in range(2, self._page_count(first_page) + 1):
+                    futures[(category, page)] = executor.submit(
+                        get_page, category, page)
+            done, not_done = wait(futures.values(), timeout=remaining())
+            if not_done:
+                raise FuturesTimeoutError
+        except FuturesTimeoutError:
+            raise DeadlineExceeded(
+                self.base_url, None if deadline is None else deadline.budget)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        # Собираем записи по категориям в порядке страниц
+        # и проверяем полноту по полю count
+        data = {}
+        incomplete = []
+        for category, first_page in first_pages.items():
+            pages = [first_page] + [
+                future.result() for (name, page), future in futures.items()
+                if name == category]
+            data[category] = [record for page in pages if page is not None
+                              for record in page['results']]
+            if None in pages or len(data[category]) != first_page['count']:
+                incomplete.append(category)
+
+        stats = {
+            'categories': len(categories),
+            'pages': len(categories) + len(futures),
+            'records': sum(len(records) for records in data.values()),
+            'incomplete': incomplete,
+            'elapsed': round(time.monotonic() - started, 3),
+        }
+        print(f'{datetime.now()}: Загружены все данные: {stats}')
+
+        return SWSnapshot(data, stats)
+
+    def search(self, sw_type, term, deadline=None):
+        """Метод search возвращает список записей категории,
+           найденных swapi.dev по строке term (параметр ?search=).
+           Результаты кешируются на cache_ttl секунд. Если в кеше есть
+           результат для более короткого начала строки, ответ строится
+           фильтрацией этого результата без запроса к API (такой результат
+           устаревает вместе с исходным).
+           Возвращаются копии записей: кеш общий для всех вызовов"""
+
+        term = term.strip().lower()
+        key = (self.base_url, sw_type, term)
+        records = _search_cache.get(key)
+        if records is not None:
+            return copy.deepcopy(list(records))
+
+        # Ищем самый длинный закешированный префикс строки
+        # и фильтруем его результат так же, как это делает swapi.dev
+        fields = SEARCH_FIELDS.get(sw_type)
+        if fields is not None:
+            for size in range(len(term) - 1, 0, -1):
+                records, expires_at = _search_cache.get_with_expiry(
+                    (self.base_url, sw_type, term[:size]))
+                if records is None:
+                    continue
+                records = tuple(
+                    record for record in records
+                    if any(term in str(record.get(field, '')).lower()
+                           for field in fields))
+
+                # Производный результат живёт не дольше исходного,
+                # иначе цепочка префиксов продлевала бы устаревшие данные
+                _search_cache.set(key, records,
+                                  expires_at - time.monotonic())
+                return copy.deepcopy(list(records))
+
+        records = _search_cache.get_or_load(
+            key, lambda: self._search_pages(sw_type, term, deadline),
+            self.cache_ttl, deadline)
+        return copy.deepcopy(list(records))
+
+    def _search_pages(self, sw_type, term, deadline=None):
+        """Метод _search_pages запрашивает все страницы результата поиска:
+           первую, а затем оставшиеся параллельно"""
+
+        first_page = self._get_page(sw_type, 1, deadline, term)
+        pages = [first_page]
+        page_count = self._page_count(first_page)
+        if page_count > 1:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                pages += executor.map(
+                    lambda page: self._get_page(sw_type, page, deadline, term),
+                    range(2, page_count + 1))
+
+        # Неполный результат не кешируем
+        if None in pages:
+            raise UnknownError(f'{self.base_url}/{sw_type}/?search={term}')
+
+        return tuple(record for page in pages for record in page['results'])
+
+    def _get_page(self, sw_type, page, deadline=None, search=None):
+        """Метод _get_page возвращает страницу категории в виде словаря
+           (или None, если запрос завершился неизвестной ошибкой)"""
+
+        tail = f'/{sw_type}/?page={page}'
+        if search is not None:
+            tail += f'&search={quote(search)}'
+        response = self.get(tail, deadline)
+        if response is None:
+            return None
+        return response.json()
+
+    @staticmethod
+    def _page_count(first_page):
+        """Метод _page_count вычисляет число страниц категории
+           по полю count и размеру первой страницы"""
+
+        if first_page is None or not first_page['results']:
+            return 1
+        return math.ceil(first_page['count'] / len(first_page['results']))
+
 
 ##############################################################################
 
@@ -144,6 +832,8 @@ class SWRequester(APIRequester):
 5. IncorrectUrlFormat
 6. UnknownError
 7. MismathJSONFormat
+8. DeadlineExceeded
+9. IncompleteExportError
 """
 
 
@@ -214,8 +904,9 @@ class IncorrectUrlFormat(requests.ConnectionError):
 
 
 class UnknownError(requests.ConnectionError):
-    """Исключение на случай непредвиденных ошибок при запросе к адресу
-       НЕ ИСПОЛЬЗУЕТСЯ из-за специфики работы автотестов"""
+    """Исключение на случай непредвиденных ошибок при запросе к адресу.
+       В APIRequester.get() НЕ ИСПОЛЬЗУЕТСЯ из-за специфики работы
+       автотестов, выбрасывается при неполном результате поиска"""
 
     def __init__(self, base_url):
         self.base_url = base_url
@@ -239,20 +930,477 @@ class MismathJSONFormat(requests.ConnectionError):
                 f'так как не соответствует формату.')
 
 
+class DeadlineExceeded(requests.Timeout):
+    """Исчерпан общий бюджет времени на запрос (с учётом повторов)"""
+
+    def __init__(self, base_url, budget):
+        self.base_url = base_url
+        self.budget = budget
+        super().__init__()
+
+    def __str__(self):
+        return (f'Ошибка подключения к адресу: {self.base_url}\n'
+                f'Исчерпан бюджет времени на запрос: {self.budget} с.\n')
+
+
+class IncompleteExportError(Exception):
+    """Данные некоторых категорий загружены не полностью,
+       а частичный экспорт не разрешён"""
+
+    def __init__(self, base_url, categories):
+        self.base_url = base_url
+        self.categories = categories
+        super().__init__()
+
+    def __str__(self):
+        return (f'Экспорт из {self.base_url} отменён.\n'
+                f'Категории загружены не полностью: '
+                f'{", ".join(self.categories)}\n'
+                f'Повторите экспорт или разрешите частичный экспорт.\n')
+
+
+##############################################################################
+
+
+"""
+Модуль proxy.
+
+Назначение:
+Локальный HTTP-сервер с тем же видом адресов, что и у swapi.dev
+(/api/, /api/<категория>/, /api/<категория>/<id>/). Отдаёт ответы
+из общего кеша или снимка, а промахи загружает через SWRequester.
+
+Перечень классов:
+1. SWProxy
+2. SWProxyHandler
+"""
+
+
+class SWProxy:
+    """Класс SWProxy - кеширующий прокси к API swapi.dev:
+       - Ответы кешируются на cache_ttl секунд (не более cache_maxsize
+         адресов); из параметров запроса учитываются только
+         page, search и format
+       - Записи из снимка SWSnapshot отдаются без запросов к API
+       - Одновременные промахи по одному адресу объединяются
+         в один запрос к API
+       - Запросы к API выполняются через requester (с его пулом
+         соединений и ограничением частоты); запрос к API и ожидание
+         чужого запроса ограничены upstream_timeout секундами
+       - Ссылки на API в ответах заменяются ссылками на прокси"""
+
+    def __init__(self, requester, host='127.0.0.1', port=8000,
+                 cache_ttl=300, snapshot=None, upstream_timeout=30,
+                 cache_maxsize=10000):
+        self.requester = requester
+        self.cache_ttl = cache_ttl
+        self.upstream_timeout = upstream_timeout
+        self._cache = TTLCache(cache_maxsize)
+        self._stats = {'requests': 0, 'upstream': 0}
+        self._stats_lock = threading.Lock()
+
+        # Записи снимка храним отдельно от кеша: они не вытесняются
+        self._snapshot = {}
+        if snapshot is not None:
+            for records in snapshot.data.values():
+                for record in records:
+                    url = record.get('url', '')
+                    if url.startswith(requester.base_url):
+                        body = json.dumps(record, ensure_ascii=False)
+                        self._snapshot[url[len(requester.base_url):]] = (
+                            200, body.encode('utf-8'))
+
+        self.server = ThreadingHTTPServer((host, port), SWProxyHandler)
+        self.server.proxy = self
+        self._thread = None
+
+    @property
+    def url(self):
+        """Адрес API прокси для использования в качестве base_url"""
+
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}/api'
+
+    @property
+    def stats(self):
+        """Количество обработанных запросов и запросов к API"""
+
+        with self._stats_lock:
+            return dict(self._stats)
+
+    def fetch(self, tail, base_url=None):
+        """Метод fetch возвращает (код ответа, тело) для адреса
+           вида "/<категория>/<id>/?<параметры>" из снимка, кеша или API.
+           Ссылки на API в теле заменяются на base_url (по умолчанию -
+           адрес прокси). Ошибки API не кешируются"""
+
+        with self._stats_lock:
+            self._stats['requests'] += 1
+
+        deadline = Deadline(self.upstream_timeout)
+
+        def load():
+            with self._stats_lock:
+                self._stats['upstream'] += 1
+            response = self.requester.get(tail, deadline)
+            if response is None:
+                raise UnknownError(self.requester.base_url + tail)
+            return response.status_code, response.content
+
+        try:
+            status, body = self._snapshot.get(tail) or self._cache.get_or_load(
+                tail, load, self.cache_ttl, deadline)
+        except HttpError as error:
+            if error.status_code == 404:
+                return 404, b'{"detail": "Not found"}'
+            return error.status_code, b'{"detail": "Upstream error"}'
+        except requests.Timeout:
+            return 504, b'{"detail": "Gateway timeout"}'
+        except requests.RequestException:
+            return 502, b'{"detail": "Bad gateway"}'
+
+        body = body.replace(self.requester.base_url.encode('utf-8'),
+                            (base_url or self.url).encode('utf-8'))
+        return status, body
+
+    def start(self):
+        """Метод start запускает сервер в фоновом потоке"""
+
+        self._thread = threading.Thread(target=self.server.serve_forever,
+                                        daemon=True)
+        self._thread.start()
+        print(f'{datetime.now()}: Прокси запущен: {self.url}')
+
+    def serve_forever(self):
+        """Метод serve_forever запускает сервер в текущем потоке"""
+
+        print(f'{datetime.now()}: Прокси запущен: {self.url}')
+        self.server.serve_forever()
+
+    def stop(self):
+        """Метод stop останавливает сервер"""
+
+        self.server.shutdown()
+        self.server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+
+class SWProxyHandler(BaseHTTPRequestHandler):
+    """Класс SWProxyHandler обрабатывает GET-запросы к SWProxy"""
+
+    # /api/, /api/<категория>/ и /api/<категория>/<id>/
+    path_pattern = re.compile(r'^/api(/[a-z]+(/\d+)?)?/$')
+
+    # Параметры запроса, которые передаются в API и входят в ключ кеша
+    query_params = ('format', 'page', 'search')
+
+    # Допустимый заголовок Host: имя, IPv4 или [IPv6] и необязательный порт
+    host_pattern = re.compile(
+        r'^(\[[0-9A-Fa-f:.]+\]|[A-Za-z0-9.-]+)(:\d{1,5})?$')
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        if not self.path_pattern.match(parts.path):
+            status, body = 404, b'{"detail": "Not found"}'
+        else:
+            tail = parts.path[len('/api'):]
+            query = sorted((name, value) for name, value
+                           in parse_qsl(parts.query)
+                           if name in self.query_params)
+            if query:
+                tail += f'?{urlencode(query)}'
+
+            # Ссылки в ответе строим по адресу, на который пришёл клиент
+            # (если заголовок Host некорректен - по адресу прокси)
+            host = self.headers.get('Host') or ''
+            base_url = None
+            if self.host_pattern.match(host):
+                base_url = f'http://{host}/api'
+            status, body = self.server.proxy.fetch(tail, base_url)
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        print(f'{datetime.now()}: {self.address_string()} - {format % args}')
+
+
 ##############################################################################
 
 
-def save_sw_data():
+"""
+Модуль transform.
+
+Назначение:
+Нормализация записей swapi.dev после загрузки: числа из строк,
+метки времени, идентификаторы вместо ссылок. Записи обрабатываются
+пачками в пуле процессов (или в текущем процессе) и потоком
+записываются в файлы выбранного формата.
+
+Функции:
+1. normalize_value()
+2. normalized_key()
+3. normalize_record()
+4. transform_records()
+5. export_sw_data()
+"""
+
+# Строки, означающие отсутствие значения
+EMPTY_VALUES = ('unknown', 'n/a')
+
+INT_PATTERN = re.compile(r'^-?(\d{1,3}(,\d{3})+|\d+)$')
+FLOAT_PATTERN = re.compile(r'^-?\d+\.\d+$')
+RESOURCE_URL_PATTERN = re.compile(r'^https?://\S+/(\d+)/?$')
+TIMESTAMP_FIELDS = ('created', 'edited')
+
+
+def normalize_value(key, value):
+    """Функция normalize_value нормализует значение поля записи:
+       - "unknown", "n/a" -> None
+       - "1,000" -> 1000, "1.5" -> 1.5
+       - created / edited -> метка времени UNIX (в секундах)
+       - ссылка на ресурс (или список ссылок) -> id (или список id)"""
+
+    if isinstance(value, list):
+        return [normalize_value(key, item) for item in value]
+    if not isinstance(value, str):
+        return value
+    if value.lower() in EMPTY_VALUES:
+        return None
+    if key in TIMESTAMP_FIELDS:
+        try:
+            return datetime.fromisoformat(
+                value.replace('Z', '+00:00')).timestamp()
+        except ValueError:
+            return value
+    if INT_PATTERN.match(value):
+        return int(value.replace(',', ''))
+    if FLOAT_PATTERN.match(value):
+        return float(value)
+    match = RESOURCE_URL_PATTERN.match(value)
+    if match:
+        return int(match.group(1))
+    return value
+
+
+def normalized_key(key):
+    """Функция normalized_key возвращает имя поля после нормализации:
+       собственная ссылка записи (url) становится полем id"""
+
+    return 'id' if key == 'url' else key
+
+
+def normalize_record(record):
+    """Функция normalize_record возвращает нормализованную копию записи.
+       Собственная ссылка записи (url) заменяется на поле id"""
+
+    return {normalized_key(key): normalize_value(normalized_key(key), value)
+            for key, value in record.items()}
+
+
+def _normalize_batch(records):
+    """Функция _normalize_batch нормализует пачку записей
+       (выполняется в процессах пула)"""
+
+    return [normalize_record(record) for record in records]
+
+
+def transform_records(records, executor=None, chunk_size=100,
+                      max_in_flight=None):
+    """Функция transform_records возвращает генератор нормализованных
+       записей в исходном порядке. Записи делятся на пачки по chunk_size
+       и обрабатываются в пуле процессов executor; без пула
+       (или если пул перестал работать) - в текущем процессе.
+       В пул одновременно передаётся не больше max_in_flight пачек
+       (по умолчанию - вдвое больше числа ядер)"""
+
+    if chunk_size < 1:
+        raise ValueError(f'Размер пачки записей должен быть не меньше 1, '
+                         f'получено: {chunk_size}')
+    batches = (records[i:i + chunk_size]
+               for i in range(0, len(records), chunk_size))
+    if executor is not None:
+        if max_in_flight is None:
+            max_in_flight = 2 * (os.cpu_count() or 1)
+
+        # Пачки в пуле: [пачка, future]. Пачка удаляется из очереди
+        # только после выдачи её результата, поэтому при сбое пула
+        # необработанные пачки не теряются
+        in_flight = deque()
+        try:
+            for batch in batches:
+                in_flight.append([batch, None])
+                in_flight[-1][1] = executor.submit(_normalize_batch, batch)
+                if len(in_flight) >= max_in_flight:
+                    yield from in_flight[0][1].result()
+                    in_flight.popleft()
+            while in_flight:
+                yield from in_flight[0][1].result()
+                in_flight.popleft()
+        except (OSError, BrokenProcessPool) as error:
+            print(f'{datetime.now()}: Пул процессов недоступен ({error}), '
+                  f'обработка продолжается в текущем процессе')
+            for batch, future in in_flight:
+                if future is not None:
+                    future.cancel()
+            for batch, _ in in_flight:
+                yield from _normalize_batch(batch)
+    for batch in batches:
+        yield from _normalize_batch(batch)
+
+
+def _write_ndjson(f, records, fieldnames):
+    """Функция _write_ndjson записывает записи в формате NDJSON
+       (по одному JSON-объекту на строку); fieldnames не используется"""
+
+    for record in records:
+        f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+
+def _write_json(f, records, fieldnames):
+    """Функция _write_json записывает записи JSON-массивом, не собирая
+       их в памяти целиком; fieldnames не используется"""
+
+    f.write('[')
+    for i, record in enumerate(records):
+        if i:
+            f.write(',\n')
+        f.write(json.dumps(record, ensure_ascii=False))
+    f.write(']\n')
+
+
+def _write_csv(f, records, fieldnames):
+    """Функция _write_csv записывает записи в формате CSV
+       со столбцами fieldnames (все поля всех записей категории)"""
+
+    writer = csv.DictWriter(f, fieldnames=fieldnames, restval='')
+    writer.writeheader()
+    for record in records:
+        # Списки записываем через ";", отсутствующие значения - пустыми
+        writer.writerow({key: ';'.join(map(str, value))
+                         if isinstance(value, list) else value
+                         for key, value in record.items()})
+
+
+# Форматы файлов для export_sw_data
+EXPORT_WRITERS = {
+    'ndjson': _write_ndjson,
+    'json': _write_json,
+    'csv': _write_csv,
+}
+
+
+def export_sw_data(folder_for_file='data', file_format='ndjson',
+                   workers=None, chunk_size=100, timeout=None,
+                   base_url='https://swapi.dev/api', allow_partial=False):
+    """Функция export_sw_data загружает все данные с API по адресу
+       base_url (swapi.dev или совместимого), нормализует записи
+       (см. normalize_record) и сохраняет каждую категорию в файл
+       <категория>.<file_format>.
+       Нормализация выполняется в workers процессах (по умолчанию -
+       по числу ядер) пачками по chunk_size записей; workers=1
+       означает обработку в текущем процессе.
+       Если часть категорий загружена не полностью, экспорт отменяется
+       (IncompleteExportError) до записи файлов; при allow_partial=True
+       неполные категории записываются с предупреждением.
+       Возвращает количество записанных записей"""
+
+    if file_format not in EXPORT_WRITERS:
+        raise ValueError(f'Неизвестный формат файла: {file_format}. '
+                         f'Доступные форматы: {", ".join(EXPORT_WRITERS)}')
+    if chunk_size < 1:
+        raise ValueError(f'Размер пачки записей должен быть не меньше 1, '
+                         f'получено: {chunk_size}')
+    write = EXPORT_WRITERS[file_format]
+
+    sqrequester_object = SWRequester(base_url)
+    snapshot = sqrequester_object.fetch_all(Deadline(timeout))
+    incomplete = snapshot.stats.get('incomplete', [])
+    if incomplete and not allow_partial:
+        raise IncompleteExportError(base_url, incomplete)
+    if incomplete:
+        print(f'{datetime.now()}: Категории загружены не полностью, '
+              f'их файлы содержат часть записей: {incomplete}')
+    Path(folder_for_file).mkdir(exist_ok=True)
+
+    # Пул процессов один на весь запуск; если создать его нельзя,
+    # обрабатываем записи в текущем процессе
+    executor = None
+    if workers is None or workers > 1:
+        try:
+            executor = ProcessPoolExecutor(max_workers=workers)
+        except (OSError, NotImplementedError) as error:
+            print(f'{datetime.now()}: Пул процессов недоступен ({error}), '
+                  f'обработка выполняется в текущем процессе')
+
+    i = 0
+    try:
+        for category, records in snapshot.data.items():
+            full_file_path = f'{folder_for_file}/{category}.{file_format}'
+            with open(full_file_path, 'w', encoding='utf-8',
+                      newline='') as f:
+                fieldnames = list(dict.fromkeys(
+                    normalized_key(key) for record in records
+                    for key in record))
+                write(f, transform_records(records, executor, chunk_size),
+                      fieldnames)
+            i += len(records)
+            print(f'{datetime.now()}: Выполнена запись в {full_file_path}\n')
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    print(f'{datetime.now()}: Файлы сохранены в '
+          f'"{folder_for_file}/"\nКоличество записей: {i}')
+
+    return i
+
+
+##############################################################################
+
+
+"""
+Модуль save.
+
+Назначение:
+Сохранение данных swapi.dev в файлы, формирование ленты изменений
+между запусками и запуск кеширующего прокси.
+
+Функции:
+1. save_sw_data()
+2. record_hash()
+3. record_fingerprint()
+4. diff_snapshots()
+5. merge_incomplete()
+6. save_sw_changes()
+7. serve_sw_proxy()
+8. positive_int()
+"""
+
+
+def save_sw_data(timeout=None, max_workers=4,
+                 base_url='https://swapi.dev/api'):
     """Функция save_sw_data принимает на вход URL-адрес
        и с помощью пакета star_requests сохраняет информацию
-       о категориях со swapi.dev в файлы"""
+       о категориях со swapi.dev в файлы.
+       Категории запрашиваются параллельно (max_workers потоков),
+       timeout - общий бюджет времени на весь запуск (в секундах),
+       base_url - адрес API (swapi.dev или совместимого)"""
+
+    # Общий бюджет времени передаём во все запросы запуска
+    deadline = Deadline(timeout)
+    deadline_kwargs = {} if timeout is None else {'deadline': deadline}
 
     # Создаём объект класса SWRequesters, передавая ему URL
-    sqrequester_object = SWRequester('https://swapi.dev/api')
+    sqrequester_object = SWRequester(base_url)
 
     # Получаем и сохраняем список категорий
     # с помощью метода get_sw_cetegories()
-    categories_list = sqrequester_object.get_sw_categories()
+    categories_list = sqrequester_object.get_sw_categories(**deadline_kwargs)
 
     # Указываем имя папки в корне проекта, куда будут сохраняться файлы
     folder_for_file = 'data'
@@ -263,24 +1411,215 @@ def save_sw_data():
     # Объявляем счётчик для подсчёта сохранённых файлов
     i = 0
 
-    # Открываем цикл и идём по каждой категории из списка
-    for category in categories_list:
-        i += 1
-
-        # Формируем полный путь файла для его дальнейшего открытия
-        full_file_path = f'{folder_for_file}/{category}.txt'
-
-        # Открываем файл на запись и записываем в него данные,
-        # полученные методом get_sw_info() по текущей категории
-        with open(full_file_path, 'w') as f:
-            f.write(sqrequester_object.get_sw_info(category))
-            print(f'{datetime.now()}: Выполнена запись в {full_file_path}\n')
+    # Запрашиваем содержимое категорий параллельно
+    # и идём по результатам в порядке списка категорий
+    get_sw_info = partial(sqrequester_object.get_sw_info, **deadline_kwargs)
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        results = executor.map(get_sw_info, categories_list,
+                               timeout=deadline.remaining())
+        for category, category_text in zip(categories_list, results):
+            i += 1
+
+            # Формируем полный путь файла для его дальнейшего открытия
+            full_file_path = f'{folder_for_file}/{category}.txt'
+
+            # Открываем файл на запись и записываем в него данные,
+            # полученные методом get_sw_info() по текущей категории
+            with open(full_file_path, 'w') as f:
+                f.write(category_text)
+                print(f'{datetime.now()}: Выполнена запись в '
+                      f'{full_file_path}\n')
+    except FuturesTimeoutError:
+        raise DeadlineExceeded(base_url, timeout)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
 
     print(f'{datetime.now()}: Файлы сохранены в '
           f'"{folder_for_file}/"\nКоличество файлов: {i}')
 
 
+def record_hash(record):
+    """Функция record_hash возвращает хеш всех полей записи"""
+
+    fields = json.dumps(record, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(fields.encode('utf-8')).hexdigest()
+
+
+def record_fingerprint(record):
+    """Функция record_fingerprint возвращает отпечаток записи:
+       метку времени edited, если она есть, иначе хеш всех полей"""
+
+    if 'edited' in record:
+        return record['edited']
+    return record_hash(record)
+
+
+def _record_key(record):
+    """Функция _record_key возвращает ключ записи для сравнения снимков:
+       URL записи, а при его отсутствии - хеш всех полей"""
+
+    return record.get('url') or record_hash(record)
+
+
+def diff_snapshots(old, new):
+    """Функция diff_snapshots сравнивает два снимка SWSnapshot по записям
+       (ключ - URL записи) и возвращает генератор изменений вида
+       {"op": "added" | "changed" | "removed", "category", "url", "record"}.
+       Для удалённых записей поле record не заполняется.
+       Для категорий, загруженных в new не полностью
+       (new.stats["incomplete"]), удаления не выдаются"""
+
+    incomplete = set(new.stats.get('incomplete', []))
+    for category in sorted(set(old.data) | set(new.data)):
+        old_records = {_record_key(record): record
+                       for record in old.data.get(category, [])}
+        new_records = {_record_key(record): record
+                       for record in new.data.get(category, [])}
+
+        for url, record in new_records.items():
+            if url not in old_records:
+                yield {'op': 'added', 'category': category, 'url': url,
+                       'record': record}
+            elif (record_fingerprint(record)
+                  != record_fingerprint(old_records[url])):
+                yield {'op': 'changed', 'category': category, 'url': url,
+                       'record': record}
+        if category in incomplete:
+            continue
+        for url in sorted(old_records.keys() - new_records.keys()):
+            yield {'op': 'removed', 'category': category, 'url': url}
+
+
+def merge_incomplete(old, new):
+    """Функция merge_incomplete возвращает снимок new, в котором
+       для неполных категорий сохранены записи из old, не попавшие
+       в new. Так недогруженные записи не считаются удалёнными
+       и в следующем запуске не появляются как добавленные"""
+
+    data = dict(new.data)
+    for category in new.stats.get('incomplete', []):
+        keys = {_record_key(record) for record in data.get(category, [])}
+        data[category] = data.get(category, []) + [
+            record for record in old.data.get(category, [])
+            if _record_key(record) not in keys]
+    return SWSnapshot(data, new.stats)
+
+
+def save_sw_changes(folder_for_file='data', timeout=None,
+                    base_url='https://swapi.dev/api'):
+    """Функция save_sw_changes загружает все данные с API по адресу
+       base_url (swapi.dev или совместимого), сравнивает их с предыдущим
+       снимком и записывает только изменения в файл changes.ndjson
+       (по одному JSON-объекту на строку).
+       Новый снимок сохраняется в snapshot.json для следующего запуска;
+       для неполных категорий в нём остаются записи предыдущего снимка.
+       Возвращает количество изменений"""
+
+    snapshot_path = Path(folder_for_file) / 'snapshot.json'
+    feed_path = Path(folder_for_file) / 'changes.ndjson'
+    Path(folder_for_file).mkdir(exist_ok=True)
+
+    # Загружаем текущие данные и предыдущий снимок (если он есть)
+    sqrequester_object = SWRequester(base_url)
+    new = sqrequester_object.fetch_all(Deadline(timeout))
+    if snapshot_path.exists():
+        old = SWSnapshot.load(snapshot_path)
+    else:
+        old = SWSnapshot({})
+    if new.stats.get('incomplete'):
+        print(f'{datetime.now()}: Категории загружены не полностью, '
+              f'удаления в них не учитываются: {new.stats["incomplete"]}')
+
+    # Записываем ленту изменений построчно
+    i = 0
+    with open(feed_path, 'w', encoding='utf-8') as f:
+        for change in diff_snapshots(old, new):
+            i += 1
+            f.write(json.dumps(change, ensure_ascii=False) + '\n')
+
+    # Снимок сохраняем только после записи ленты,
+    # чтобы при сбое изменения не потерялись
+    merge_incomplete(old, new).save(snapshot_path)
+
+    print(f'{datetime.now()}: Лента изменений сохранена в "{feed_path}"\n'
+          f'Количество изменений: {i}')
+
+    return i
+
+
+def serve_sw_proxy(host='127.0.0.1', port=8000, snapshot_path=None,
+                   rate_limit=None, timeout=30,
+                   base_url='https://swapi.dev/api'):
+    """Функция serve_sw_proxy запускает локальный кеширующий прокси
+       к API по адресу base_url (см. SWProxy) в текущем потоке.
+       timeout - предельное время запроса к API (в секундах)"""
+
+    sqrequester_object = SWRequester(base_url, timeout=timeout,
+                                     rate_limit=rate_limit)
+    snapshot = None
+    if snapshot_path is not None:
+        snapshot = SWSnapshot.load(snapshot_path)
+    SWProxy(sqrequester_object, host, port, snapshot=snapshot,
+            upstream_timeout=timeout).serve_forever()
+
+
+def positive_int(value):
+    """Функция positive_int - тип аргумента командной строки:
+       целое число не меньше 1"""
+
+    try:
+        number = int(value)
+    except ValueError:
+        number = 0
+    if number < 1:
+        raise argparse.ArgumentTypeError(
+            f'ожидается целое число не меньше 1, получено: {value}')
+    return number
+
+
 # Вызываем функцию для получения и сохранения информации
 # о категориях из swapi.dev в файловую систему
+# (ленту изменений сохраняем командой "python swapi.py changes",
+# нормализованные данные - командой "python swapi.py export",
+# прокси запускаем командой "python swapi.py proxy")
 if __name__ == '__main__':
-    save_sw_data()
+    parser = argparse.ArgumentParser()
+    parser.add_argument('mode', nargs='?', default='save',
+                        choices=('save', 'changes', 'export', 'proxy'))
+    parser.add_argument('--base-url', default='https://swapi.dev/api',
+                        help='адрес API (swapi.dev или совместимого)')
+    parser.add_argument('--format', default='ndjson',
+                        choices=tuple(EXPORT_WRITERS),
+                        help='формат файлов экспорта')
+    parser.add_argument('--workers', type=int,
+                        help='число процессов нормализации '
+                             '(1 - в текущем процессе)')
+    parser.add_argument('--chunk-size', type=positive_int, default=100,
+                        help='размер пачки записей для процесса')
+    parser.add_argument('--allow-partial', action='store_true',
+                        help='записывать экспорт, даже если часть '
+                             'категорий загружена не полностью')
+    parser.add_argument('--folder', default='data',
+                        help='папка для снимка, ленты изменений '
+                             'и файлов экспорта')
+    parser.add_argument('--timeout', type=float,
+                        help='общий бюджет времени на загрузку '
+                             '(для прокси - на запрос к swapi.dev), с.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--snapshot', help='снимок SWSnapshot для прокси')
+    parser.add_argument('--rate-limit', type=float,
+                        help='запросов в секунду к swapi.dev')
+    args = parser.parse_args()
+    if args.mode == 'proxy':
+        serve_sw_proxy(args.host, args.port, args.snapshot, args.rate_limit,
+                       args.timeout or 30, args.base_url)
+    elif args.mode == 'changes':
+        save_sw_changes(args.folder, args.timeout, args.base_url)
+    elif args.mode == 'export':
+        export_sw_data(args.folder, args.format, args.workers,
+                       args.chunk_size, args.timeout, args.base_url,
+                       args.allow_partial)
+    else:
+        save_sw_data(args.timeout, base_url=args.base_url)
@@ -0,0 +1,12 @@
+import pytest
+
+import swapi
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    swapi._root_cache.invalidate()
+    swapi._search_cache.invalidate()
+    yield
+    swapi._root_cache.invalidate()
+    swapi._search_cache.invalidate()
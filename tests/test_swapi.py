@@ -1,4 +1,14 @@
+import argparse
+import csv
+import io
+import itertools
+import json
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
 import pytest
 import requests
@@ -110,6 +120,866 @@ class TestSWRequester:
             ), "Убедитесь, что метод `get_sw_categories` класса `SWRequester` возвращает требуемое значение (ключи словаря)"  # noqa
 
 
+class TestDeadlineAndHedging:
+    def test_expired_deadline(self):
+        result = swapi.APIRequester("https://swapi.dev/api")
+
+        with requests_mock.Mocker() as m:
+            m.get("https://swapi.dev/api/url", json={})
+            with pytest.raises(swapi.DeadlineExceeded):
+                result.get("/url", swapi.Deadline(0))
+            assert not m.called, "Запрос с исчерпанным бюджетом не должен выполняться"  # noqa
+
+    def test_retries(self):
+        result = swapi.APIRequester(
+            "https://swapi.dev/api", retries=2, backoff=0
+        )
+
+        with requests_mock.Mocker() as m:
+            m.get(
+                "https://swapi.dev/api/url",
+                [
+                    {"exc": requests.exceptions.ConnectionError},
+                    {"exc": requests.exceptions.ReadTimeout},
+                    {"json": {"name": "retry-mock"}},
+                ],
+            )
+            assert result.get("/url").json() == {"name": "retry-mock"}
+            assert m.call_count == 3
+
+    def test_hedge_policy_delay(self):
+        policy = swapi.HedgePolicy(percentile=50, min_samples=4)
+        assert policy.delay() is None
+        for latency in (0.4, 0.1, 0.3, 0.2):
+            policy.record(latency)
+        assert policy.delay() == 0.2
+
+    def test_hedged_request(self, monkeypatch):
+        policy = swapi.HedgePolicy(percentile=50, min_samples=1)
+        policy.record(0.05)
+        result = swapi.APIRequester("https://swapi.dev/api", hedge=policy)
+        calls = itertools.count()
+
+        # requests_mock выполняет запросы последовательно,
+        # поэтому подменяем одиночный запрос целиком
+        def request(self, url, timeout):
+            response = requests.Response()
+            response.status_code = 200
+            response.raw = io.BytesIO()
+            if next(calls) == 0:
+                time.sleep(1)
+                response._content = b"slow"
+            else:
+                response._content = b"fast"
+            return response
+
+        monkeypatch.setattr(swapi.APIRequester, "_request", request)
+        started = time.monotonic()
+        resp = result.get("/url")
+        assert time.monotonic() - started < 0.5
+        assert resp.text == "fast"
+        assert next(calls) == 2
+
+    def slow_request(self, calls, delay):
+        def request(self, url, timeout):
+            calls.append(timeout)
+            time.sleep(delay)
+            response = requests.Response()
+            response.status_code = 200
+            response.raw = io.BytesIO()
+            response._content = b"slow"
+            return response
+
+        return request
+
+    def test_hedged_request_deadline(self, monkeypatch):
+        policy = swapi.HedgePolicy(percentile=50, min_samples=1)
+        policy.record(0.05)
+        result = swapi.APIRequester("https://swapi.dev/api", hedge=policy)
+        calls = []
+        monkeypatch.setattr(
+            swapi.APIRequester, "_request", self.slow_request(calls, 1)
+        )
+
+        started = time.monotonic()
+        with pytest.raises(swapi.DeadlineExceeded):
+            result.get("/url", swapi.Deadline(0.3))
+        assert time.monotonic() - started < 0.6
+        assert len(calls) == 2, "Основной запрос и один дубль"
+        assert all(0 < timeout <= 0.3 for timeout in calls)
+
+    def test_hedge_only_with_free_worker(self, monkeypatch):
+        policy = swapi.HedgePolicy(percentile=50, min_samples=1)
+        policy.record(0.01)
+        result = swapi.APIRequester(
+            "https://swapi.dev/api", hedge=policy, hedge_workers=2
+        )
+        calls = []
+        monkeypatch.setattr(
+            swapi.APIRequester, "_request", self.slow_request(calls, 0.15)
+        )
+
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            results = list(executor.map(lambda _: result.get("/url"), range(16)))  # noqa
+        assert time.monotonic() - started < 0.4, "Запросы не должны ждать в очереди"  # noqa
+        assert [r.text for r in results] == ["slow"] * 16
+        assert len(calls) <= 16 + 2
+
+    def test_attempt_timeout(self, monkeypatch):
+        result = swapi.APIRequester(
+            "https://swapi.dev/api", attempt_timeout=5
+        )
+        calls = []
+        monkeypatch.setattr(
+            swapi.APIRequester, "_request", self.slow_request(calls, 0)
+        )
+        result.get("/url")
+        result.get("/url", swapi.Deadline(1))
+        assert calls[0] == 5
+        assert calls[1] <= 1
+
+    def test_save_sw_data_deadline(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+
+        def slow_text(request, context):
+            time.sleep(0.2)
+            return "text"
+
+        with requests_mock.Mocker() as m:
+            m.get(
+                "https://swapi.dev/api/",
+                json={f"category_{i}": "url" for i in range(4)},
+            )
+            for i in range(4):
+                m.get(f"https://swapi.dev/api/category_{i}/", text=slow_text)  # noqa
+
+            started = time.monotonic()
+            with pytest.raises(swapi.DeadlineExceeded):
+                swapi.save_sw_data(timeout=0.3)
+            assert time.monotonic() - started < 0.6
+
+
+class TestFetchAll:
+    base_url = "https://swapi.dev/api"
+
+    def mock_universe(self, m):
+        m.get(
+            f"{self.base_url}/",
+            json={
+                "people": f"{self.base_url}/people/",
+                "films": f"{self.base_url}/films/",
+            },
+        )
+        m.get(
+            f"{self.base_url}/people/?page=1",
+            json={"count": 3, "results": [{"name": "Luke"}, {"name": "C-3PO"}]},  # noqa
+        )
+        m.get(
+            f"{self.base_url}/people/?page=2",
+            json={"count": 3, "results": [{"name": "R2-D2"}]},
+        )
+        m.get(
+            f"{self.base_url}/films/?page=1",
+            json={"count": 1, "results": [{"title": "A New Hope"}]},
+        )
+
+    def test_fetch_all(self, tmp_path):
+        result = swapi.SWRequester(self.base_url, max_workers=4)
+
+        with requests_mock.Mocker() as m:
+            self.mock_universe(m)
+            snapshot = result.fetch_all()
+
+        assert snapshot.data == {
+            "people": [{"name": "Luke"}, {"name": "C-3PO"}, {"name": "R2-D2"}],  # noqa
+            "films": [{"title": "A New Hope"}],
+        }
+        assert snapshot.stats["pages"] == 3
+        assert snapshot.stats["records"] == 4
+        assert snapshot.stats["incomplete"] == []
+
+        path = tmp_path / "snapshot.json"
+        snapshot.save(path)
+        assert swapi.SWSnapshot.load(path).data == snapshot.data
+
+    def test_fetch_all_incomplete(self):
+        result = swapi.SWRequester(self.base_url)
+
+        with requests_mock.Mocker() as m:
+            self.mock_universe(m)
+            m.get(
+                f"{self.base_url}/people/?page=2",
+                exc=requests.exceptions.RequestException,
+            )
+            snapshot = result.fetch_all()
+
+        assert snapshot.stats["incomplete"] == ["people"]
+
+    @pytest.mark.parametrize("status_code", [404, 503])
+    def test_fetch_all_http_error(self, status_code):
+        result = swapi.SWRequester(self.base_url)
+
+        with requests_mock.Mocker() as m:
+            self.mock_universe(m)
+            m.get(f"{self.base_url}/people/?page=2", status_code=status_code)
+            m.get(f"{self.base_url}/films/?page=1", status_code=status_code)
+            snapshot = result.fetch_all()
+
+        assert snapshot.stats["incomplete"] == ["people", "films"]
+        assert snapshot.data == {
+            "people": [{"name": "Luke"}, {"name": "C-3PO"}],
+            "films": [],
+        }
+
+    def test_fetch_all_deadline(self):
+        result = swapi.SWRequester(self.base_url)
+
+        def slow_page(request, context):
+            time.sleep(0.2)
+            return {"count": 1, "results": [{"name": "Luke"}]}
+
+        with requests_mock.Mocker() as m:
+            self.mock_universe(m)
+            m.get(f"{self.base_url}/people/?page=1", json=slow_page)
+            m.get(f"{self.base_url}/films/?page=1", json=slow_page)
+            with pytest.raises(swapi.DeadlineExceeded):
+                result.fetch_all(swapi.Deadline(0.3))
+
+    def test_rate_limit(self):
+        limiter = swapi.RateLimiter(20)
+        started = time.monotonic()
+        for _ in range(3):
+            limiter.acquire()
+        assert time.monotonic() - started >= 0.1
+
+
+class TestChangeFeed:
+    old = swapi.SWSnapshot(
+        {
+            "people": [
+                {"url": "p/1/", "name": "Luke", "edited": "2014-12-20"},
+                {"url": "p/2/", "name": "C-3PO", "edited": "2014-12-20"},
+            ],
+            "films": [{"url": "f/1/", "title": "A New Hope"}],
+        }
+    )
+    new = swapi.SWSnapshot(
+        {
+            "people": [
+                {"url": "p/1/", "name": "Luke", "edited": "2014-12-20"},
+                {"url": "p/3/", "name": "R2-D2", "edited": "2014-12-20"},
+            ],
+            "films": [{"url": "f/1/", "title": "Episode IV"}],
+        }
+    )
+
+    def test_diff_snapshots(self):
+        changes = list(swapi.diff_snapshots(self.old, self.new))
+        assert [(c["op"], c["url"]) for c in changes] == [
+            ("changed", "f/1/"),
+            ("added", "p/3/"),
+            ("removed", "p/2/"),
+        ]
+        assert changes[0]["record"] == {"url": "f/1/", "title": "Episode IV"}  # noqa
+        assert "record" not in changes[2]
+
+    def test_save_sw_changes(self, tmp_path, monkeypatch):
+        snapshots = iter([self.old, self.new])
+        monkeypatch.setattr(
+            swapi.SWRequester,
+            "fetch_all",
+            lambda self, deadline=None: next(snapshots),
+        )
+
+        assert swapi.save_sw_changes(tmp_path) == 3
+        assert swapi.save_sw_changes(tmp_path) == 3
+        with open(tmp_path / "changes.ndjson") as f:
+            changes = [json.loads(line) for line in f]
+        assert [c["op"] for c in changes] == ["changed", "added", "removed"]
+        saved = swapi.SWSnapshot.load(tmp_path / "snapshot.json")
+        assert saved.data == self.new.data
+        assert not list(tmp_path.glob("*.tmp"))
+
+    def test_save_sw_changes_base_url(self, tmp_path, monkeypatch):
+        base_urls = []
+
+        def fetch_all(self, deadline=None):
+            base_urls.append(self.base_url)
+            return swapi.SWSnapshot({})
+
+        monkeypatch.setattr(swapi.SWRequester, "fetch_all", fetch_all)
+        swapi.save_sw_changes(tmp_path, base_url="http://localhost:8000/api")  # noqa
+        assert base_urls == ["http://localhost:8000/api"]
+
+    def test_incomplete_category(self, tmp_path):
+        base_url = "https://swapi.dev/api"
+        people = [
+            {"url": f"{base_url}/people/1/", "edited": "2014-12-20"},
+            {"url": f"{base_url}/people/2/", "edited": "2014-12-20"},
+        ]
+
+        def run(page_2):
+            with requests_mock.Mocker() as m:
+                m.get(f"{base_url}/", json={"people": f"{base_url}/people/"})
+                m.get(
+                    f"{base_url}/people/?page=1",
+                    json={"count": 2, "results": people[:1]},
+                )
+                m.get(f"{base_url}/people/?page=2", **page_2)
+                count = swapi.save_sw_changes(tmp_path)
+            with open(tmp_path / "changes.ndjson") as f:
+                return count, [json.loads(line) for line in f]
+
+        assert run({"json": {"count": 2, "results": people[1:]}})[0] == 2
+        count, changes = run({"status_code": 503})
+        assert (count, changes) == (0, []), "Недогруженные записи не удалены"  # noqa
+        saved = swapi.SWSnapshot.load(tmp_path / "snapshot.json")
+        assert saved.data == {"people": people}
+        assert run({"json": {"count": 2, "results": people[1:]}}) == (0, [])
+
+    def test_records_without_url(self):
+        old = swapi.SWSnapshot(
+            {"people": [{"name": "Luke", "edited": "e"}, {"name": "Leia", "edited": "e"}]}  # noqa
+        )
+        new = swapi.SWSnapshot({"people": [{"name": "Luke", "edited": "e"}]})  # noqa
+        changes = list(swapi.diff_snapshots(old, new))
+        assert [c["op"] for c in changes] == ["removed"]
+
+
+class TestCategoriesCache:
+    base_url = "https://swapi.dev/api"
+
+    def test_shared_cache(self):
+        with requests_mock.Mocker() as m:
+            m.get(f"{self.base_url}/", json={"people": "p", "films": "f"})
+            first = swapi.SWRequester(self.base_url).get_sw_categories()
+            second = swapi.SWRequester(self.base_url).get_sw_categories()
+            assert m.call_count == 1
+
+        assert first == second == {"people": "p", "films": "f"}.keys()
+
+    def test_invalidate_and_ttl(self):
+        result = swapi.SWRequester(self.base_url, cache_ttl=0)
+        assert result.categories is None
+
+        with requests_mock.Mocker() as m:
+            m.get(f"{self.base_url}/", json={"people": "p"})
+            result.get_sw_categories()
+            result.get_sw_categories()
+            assert m.call_count == 2
+
+            result = swapi.SWRequester(self.base_url)
+            result.get_sw_categories()
+            assert result.categories_keys == {"people": "p"}.keys()
+            result.invalidate_categories()
+            assert result.categories is None
+
+    def test_coalesced_misses(self):
+        cache = swapi.TTLCache()
+        calls = itertools.count()
+
+        def load():
+            next(calls)
+            time.sleep(0.1)
+            return "value"
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(
+                executor.map(
+                    lambda _: cache.get_or_load("key", load, 60), range(8)
+                )
+            )
+        assert results == ["value"] * 8
+        assert next(calls) == 1
+
+    def test_waiter_deadline(self):
+        cache = swapi.TTLCache()
+
+        def load():
+            time.sleep(1)
+            return "value"
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            executor.submit(cache.get_or_load, "key", load, 60)
+            time.sleep(0.05)
+            started = time.monotonic()
+            with pytest.raises(swapi.DeadlineExceeded):
+                cache.get_or_load("key", load, 60, swapi.Deadline(0.1))
+            assert time.monotonic() - started < 0.5
+
+    def test_waiter_ignores_loader_deadline(self):
+        cache = swapi.TTLCache()
+
+        def tight_load():
+            time.sleep(0.1)
+            raise swapi.DeadlineExceeded("key", 0.1)
+
+        def load():
+            time.sleep(0.05)
+            return "value"
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            tight = executor.submit(
+                cache.get_or_load, "key", tight_load, 60, swapi.Deadline(0.1)
+            )
+            time.sleep(0.02)
+            relaxed = executor.submit(cache.get_or_load, "key", load, 60)
+            with pytest.raises(swapi.DeadlineExceeded):
+                tight.result()
+            assert relaxed.result() == "value"
+
+    def test_failed_load_propagates(self):
+        cache = swapi.TTLCache()
+        calls = itertools.count()
+
+        def load():
+            next(calls)
+            time.sleep(0.1)
+            raise swapi.UnknownError("key")
+
+        def get(_):
+            try:
+                return cache.get_or_load("key", load, 60)
+            except swapi.UnknownError:
+                return "error"
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(get, range(8)))
+        assert results == ["error"] * 8
+        assert next(calls) == 1
+
+
+class TestThreadSafety:
+    base_url = "https://swapi.dev/api"
+
+    def test_immutable_config(self):
+        result = swapi.SWRequester(self.base_url, retries=1)
+        for name in ("base_url", "retries", "cache_ttl", "categories"):
+            with pytest.raises(AttributeError):
+                setattr(result, name, None)
+        assert result.retries == 1
+
+    def test_no_shared_cookies(self):
+        # requests_mock не заполняет cookies сессии,
+        # поэтому проверяем на настоящем локальном сервере
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = self.headers.get("Cookie", "").encode()
+                self.send_response(200)
+                if self.path == "/login/":
+                    self.send_header("Set-Cookie", "session=secret; Path=/")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            base_url = f"http://127.0.0.1:{server.server_address[1]}"
+            swapi.APIRequester(base_url).get("/login/")
+            assert swapi.APIRequester(base_url).get("/echo/").text == ""
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_shared_instance(self):
+        result = swapi.SWRequester(self.base_url)
+
+        def call(i):
+            category = f"category_{i % 4}"
+            assert result.get_sw_categories() == {"people": "p"}.keys()
+            return category, result.get_sw_info(category)
+
+        with requests_mock.Mocker() as m:
+            m.get(f"{self.base_url}/", json={"people": "p"})
+            for i in range(4):
+                m.get(f"{self.base_url}/category_{i}/", text=f"text {i}")
+
+            with ThreadPoolExecutor(max_workers=16) as executor:
+                results = list(executor.map(call, range(64)))
+
+            assert m.call_count == 1 + 64
+
+        for category, text in results:
+            assert text == f"text {category[-1]}"
+        assert result.__dict__.keys() == swapi.SWRequester(
+            self.base_url
+        ).__dict__.keys(), "Вызовы не должны добавлять атрибуты объекту"
+
+
+class TestSearch:
+    base_url = "https://swapi.dev/api"
+
+    def test_search_pagination(self):
+        result = swapi.SWRequester(self.base_url)
+
+        with requests_mock.Mocker() as m:
+            m.get(
+                f"{self.base_url}/people/?page=1&search=sky",
+                json={"count": 3, "results": [{"name": "Luke Skywalker"}, {"name": "Anakin Skywalker"}]},  # noqa
+            )
+            m.get(
+                f"{self.base_url}/people/?page=2&search=sky",
+                json={"count": 3, "results": [{"name": "Shmi Skywalker"}]},
+            )
+            assert [r["name"] for r in result.search("people", "Sky")] == [
+                "Luke Skywalker",
+                "Anakin Skywalker",
+                "Shmi Skywalker",
+            ]
+            assert m.call_count == 2
+            result.search("people", "sky")
+            assert m.call_count == 2
+
+    def test_prefix_cache(self):
+        result = swapi.SWRequester(self.base_url)
+
+        with requests_mock.Mocker() as m:
+            m.get(
+                f"{self.base_url}/people/?page=1&search=l",
+                json={"count": 3, "results": [{"name": "Luke"}, {"name": "Leia"}, {"name": "Owen Lars"}]},  # noqa
+            )
+            result.search("people", "l")
+            assert [r["name"] for r in result.search("people", "lu")] == [
+                "Luke"
+            ]
+            assert [r["name"] for r in result.search("people", "lar")] == [
+                "Owen Lars"
+            ]
+            assert m.call_count == 1
+
+    def test_derived_entry_expires_with_source(self):
+        result = swapi.SWRequester(self.base_url, cache_ttl=0.3)
+
+        with requests_mock.Mocker() as m:
+            for term in ("l", "lu", "luk"):
+                m.get(
+                    f"{self.base_url}/people/?page=1&search={term}",
+                    json={"count": 1, "results": [{"name": "Luke"}]},
+                )
+            result.search("people", "l")
+            time.sleep(0.2)
+            result.search("people", "lu")
+            assert m.call_count == 1
+            time.sleep(0.15)
+            result.search("people", "luk")
+            assert m.call_count == 2, "Производная запись устарела вместе с исходной"  # noqa
+
+    def test_results_are_copies(self):
+        result = swapi.SWRequester(self.base_url)
+
+        with requests_mock.Mocker() as m:
+            m.get(
+                f"{self.base_url}/people/?page=1&search=l",
+                json={"count": 1, "results": [{"name": "Luke", "films": []}]},  # noqa
+            )
+            records = result.search("people", "l")
+            records[0]["name"] = "HACKED"
+            records[0]["films"].append("film")
+            assert result.search("people", "l") == [
+                {"name": "Luke", "films": []}
+            ]
+            assert [r["name"] for r in result.search("people", "lu")] == [
+                "Luke"
+            ]
+
+    def test_cache_size(self):
+        cache = swapi.TTLCache(maxsize=3)
+        cache.set("expired", 0, 0)
+        for i in range(3):
+            cache.set(i, i, 60)
+        assert len(cache) == 3
+        assert cache.get("expired") is None
+        cache.get(0)
+        cache.set(3, 3, 60)
+        assert len(cache) == 3
+        assert cache.get(1) is None, "Удаляется давно не использованная запись"  # noqa
+        assert [cache.get(i) for i in (0, 2, 3)] == [0, 2, 3]
+
+    def test_search_incomplete(self):
+        result = swapi.SWRequester(self.base_url)
+
+        with requests_mock.Mocker() as m:
+            m.get(
+                f"{self.base_url}/people/?page=1&search=x",
+                exc=requests.exceptions.RequestException,
+            )
+            with pytest.raises(swapi.UnknownError):
+                result.search("people", "x")
+
+
+class StubRequester:
+    base_url = "https://swapi.dev/api"
+
+    def __init__(self):
+        self.calls = []
+
+    def get(self, tail, deadline=None):
+        self.calls.append(tail)
+        if tail == "/people/404/":
+            raise swapi.HttpError(self.base_url + tail, 404)
+        # Зависший запрос к API, не соблюдающий бюджет времени
+        time.sleep(1 if tail == "/stalled/" else 0.1)
+        response = requests.Response()
+        response.status_code = 200
+        response._content = json.dumps(
+            {"tail": tail, "next": f"{self.base_url}/people/?page=2"}
+        ).encode()
+        return response
+
+
+class TestSWProxy:
+    @pytest.fixture
+    def proxy(self):
+        snapshot = swapi.SWSnapshot(
+            {"people": [{"url": "https://swapi.dev/api/people/1/", "name": "Luke"}]}  # noqa
+        )
+        proxy = swapi.SWProxy(StubRequester(), port=0, snapshot=snapshot)
+        proxy.start()
+        yield proxy
+        proxy.stop()
+
+    def test_url_shape(self, proxy):
+        assert requests.get(f"{proxy.url}/people/1/").json() == {
+            "url": f"{proxy.url}/people/1/",
+            "name": "Luke",
+        }
+        assert requests.get(f"{proxy.url}/people/?page=2").json() == {
+            "tail": "/people/?page=2",
+            "next": f"{proxy.url}/people/?page=2",
+        }
+        assert requests.get(f"{proxy.url}/people/404/").status_code == 404
+        assert requests.get(f"{proxy.url}/people/x/y/").status_code == 404
+        assert proxy.requester.calls == ["/people/?page=2", "/people/404/"]
+
+    def test_requester_through_proxy(self, proxy):
+        result = swapi.SWRequester(proxy.url)
+        films = json.loads(result.get_sw_info("films"))
+        assert films["tail"] == "/films/"
+        assert json.loads(result.get_sw_info("films")) == films
+        assert proxy.stats == {"requests": 2, "upstream": 1}
+
+        # Ссылки из ответа ведут на прокси, а не на API
+        assert requests.get(films["next"]).json()["tail"] == "/people/?page=2"  # noqa
+        assert proxy.stats == {"requests": 3, "upstream": 2}
+
+    @pytest.mark.parametrize(
+        "host, base_url",
+        [
+            ('a"b', None),
+            ("evil/path", None),
+            ("", None),
+            ("example.com:8080", "http://example.com:8080/api"),
+            ("[::1]:8000", "http://[::1]:8000/api"),
+        ],
+    )
+    def test_host_header(self, proxy, host, base_url):
+        resp = requests.get(
+            f"{proxy.url}/people/?page=2", headers={"Host": host}
+        )
+        assert resp.json()["next"] == f"{base_url or proxy.url}/people/?page=2"  # noqa
+
+    def test_query_whitelist(self, proxy):
+        for query in ("page=2&x=1", "x=2&page=2", "page=2&_=3"):
+            requests.get(f"{proxy.url}/people/?{query}")
+        requests.get(f"{proxy.url}/people/?search=sky&format=json&page=1")
+        assert proxy.requester.calls == [
+            "/people/?page=2",
+            "/people/?format=json&page=1&search=sky",
+        ]
+
+    def test_stalled_upstream(self):
+        proxy = swapi.SWProxy(StubRequester(), port=0, upstream_timeout=0.3)
+        proxy.start()
+
+        def get(_):
+            started = time.monotonic()
+            status = requests.get(f"{proxy.url}/stalled/").status_code
+            return status, time.monotonic() - started
+
+        try:
+            with ThreadPoolExecutor(max_workers=4) as executor:
+                first = executor.submit(get, None)
+                time.sleep(0.05)
+                waiters = list(executor.map(get, range(3)))
+            assert [status for status, _ in waiters] == [504] * 3
+            assert all(elapsed < 0.6 for _, elapsed in waiters)
+            assert first.result()[0] == 200
+            assert proxy.requester.calls == ["/stalled/"]
+        finally:
+            proxy.stop()
+
+    def test_coalesced_misses(self, proxy):
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            statuses = list(
+                executor.map(
+                    lambda _: requests.get(f"{proxy.url}/planets/").status_code,  # noqa
+                    range(8),
+                )
+            )
+        assert statuses == [200] * 8
+        assert proxy.requester.calls == ["/planets/"]
+
+
+class TestTransform:
+    record = {
+        "name": "Tatooine",
+        "population": "200,000",
+        "diameter": "10465",
+        "gravity": "1 standard",
+        "surface_water": "1.5",
+        "rotation_period": "unknown",
+        "residents": [
+            "https://swapi.dev/api/people/1/",
+            "https://swapi.dev/api/people/2/",
+        ],
+        "created": "2014-12-09T13:50:49.641000Z",
+        "edited": "2014-12-20T20:58:18.411000Z",
+        "url": "https://swapi.dev/api/planets/1/",
+    }
+    normalized = {
+        "name": "Tatooine",
+        "population": 200000,
+        "diameter": 10465,
+        "gravity": "1 standard",
+        "surface_water": 1.5,
+        "rotation_period": None,
+        "residents": [1, 2],
+        "created": 1418133049.641,
+        "edited": 1419109098.411,
+        "id": 1,
+    }
+
+    def test_normalize_record(self):
+        assert swapi.normalize_record(self.record) == self.normalized
+
+    def test_transform_records(self):
+        records = [dict(self.record, name=f"P{i}") for i in range(25)]
+        serial = list(swapi.transform_records(records, chunk_size=4))
+        with ProcessPoolExecutor(max_workers=2) as executor:
+            parallel = list(
+                swapi.transform_records(records, executor, chunk_size=4)
+            )
+        assert parallel == serial
+        assert [r["name"] for r in parallel] == [f"P{i}" for i in range(25)]
+
+    class FakeExecutor:
+        def __init__(self, broken=False):
+            self.broken = broken
+            self.submitted = 0
+
+        def submit(self, fn, *args):
+            self.submitted += 1
+            future = Future()
+            if self.broken:
+                future.set_exception(BrokenProcessPool())
+            else:
+                future.set_result(fn(*args))
+            return future
+
+    def test_bounded_in_flight(self):
+        records = [dict(self.record, name=f"P{i}") for i in range(20)]
+        executor = self.FakeExecutor()
+        stream = swapi.transform_records(
+            records, executor, chunk_size=1, max_in_flight=3
+        )
+        assert next(stream)["name"] == "P0"
+        assert executor.submitted == 3
+        assert len(list(stream)) == 19
+
+    def test_broken_pool_fallback(self):
+        records = [dict(self.record, name=f"P{i}") for i in range(10)]
+        stream = swapi.transform_records(
+            records, self.FakeExecutor(broken=True), chunk_size=3
+        )
+        assert [r["name"] for r in stream] == [f"P{i}" for i in range(10)]
+
+    def test_export_sw_data(self, tmp_path, monkeypatch):
+        snapshot = swapi.SWSnapshot({"planets": [self.record] * 3})
+        monkeypatch.setattr(
+            swapi.SWRequester,
+            "fetch_all",
+            lambda self, deadline=None: snapshot,
+        )
+
+        assert swapi.export_sw_data(tmp_path, "ndjson", workers=1) == 3
+        with open(tmp_path / "planets.ndjson") as f:
+            assert [json.loads(line) for line in f] == [self.normalized] * 3
+
+        assert swapi.export_sw_data(tmp_path, "csv", workers=2) == 3
+        with open(tmp_path / "planets.csv") as f:
+            rows = list(csv.DictReader(f))
+        assert len(rows) == 3
+        assert rows[0]["residents"] == "1;2"
+        assert rows[0]["rotation_period"] == ""
+
+        with pytest.raises(ValueError):
+            swapi.export_sw_data(tmp_path, "xml")
+
+    def test_chunk_size_validation(self, tmp_path, monkeypatch):
+        def fetch_all(self, deadline=None):
+            assert False, "Размер пачки проверяется до загрузки данных"
+
+        monkeypatch.setattr(swapi.SWRequester, "fetch_all", fetch_all)
+        with pytest.raises(ValueError, match="пачки"):
+            swapi.export_sw_data(tmp_path, chunk_size=0)
+        with pytest.raises(ValueError):
+            list(swapi.transform_records([self.record], chunk_size=0))
+
+        assert swapi.positive_int("3") == 3
+        for value in ("0", "-1", "x"):
+            with pytest.raises(argparse.ArgumentTypeError):
+                swapi.positive_int(value)
+
+    def test_incomplete_export(self, tmp_path, monkeypatch, capfd):
+        snapshot = swapi.SWSnapshot(
+            {"planets": [self.record], "films": []},
+            {"incomplete": ["films"]},
+        )
+        monkeypatch.setattr(
+            swapi.SWRequester,
+            "fetch_all",
+            lambda self, deadline=None: snapshot,
+        )
+
+        with pytest.raises(swapi.IncompleteExportError, match="films"):
+            swapi.export_sw_data(tmp_path / "out", workers=1)
+        assert not (tmp_path / "out").exists()
+
+        count = swapi.export_sw_data(
+            tmp_path / "out", workers=1, allow_partial=True
+        )
+        assert count == 1
+        assert "['films']" in capfd.readouterr().out
+        assert (tmp_path / "out" / "films.ndjson").exists()
+
+    def test_export_options(self, tmp_path, monkeypatch):
+        base_urls = []
+        snapshot = swapi.SWSnapshot(
+            {"planets": [{"name": "Hoth"}, {"name": "Dagobah", "climate": "murky"}]}  # noqa
+        )
+
+        def fetch_all(self, deadline=None):
+            base_urls.append(self.base_url)
+            return snapshot
+
+        monkeypatch.setattr(swapi.SWRequester, "fetch_all", fetch_all)
+        swapi.export_sw_data(
+            tmp_path, "csv", workers=1, base_url="http://localhost:8000/api"
+        )
+        assert base_urls == ["http://localhost:8000/api"]
+        with open(tmp_path / "planets.csv") as f:
+            rows = list(csv.DictReader(f))
+        assert rows == [
+            {"name": "Hoth", "climate": ""},
+            {"name": "Dagobah", "climate": "murky"},
+        ]
+
+
 class MockPath:
     def __init__(self, path) -> None:
         global _path